@@ -11,10 +11,16 @@ class Settings(BaseSettings):
     
     # Server settings
     port: int = 8000
+    workers: int = 2
     log_level: str = "INFO"
     
     # Presidio settings
     default_language: str = "en"
+    presidio_spacy_batch_size: int = 32
+    presidio_batch_window_ms: float = 5.0
+    presidio_workers: int = 4
+    presidio_cache_size: int = 1024
+    presidio_lazy_spacy: bool = True
     
     class Config:
         env_file = ".env"
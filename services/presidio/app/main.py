@@ -3,15 +3,20 @@ Microsoft Presidio PII Sanitization Microservice
 Main FastAPI application entry point.
 """
 
-from fastapi import FastAPI, Request, HTTPException, Depends
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
+import time
 
-from app.config import get_settings, Settings
+from app.config import get_settings
+from app.middleware import AuthCORSMiddleware
 from app.routes import sanitize, analyze, health
 from app.services.presidio_service import PresidioService
+from app.services.batcher import MicroBatcher
 
 # Configure logging
 logging.basicConfig(
@@ -27,9 +32,67 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Presidio Microservice...")
     
+    settings = get_settings()
+    
+    # Resolve the API token once instead of per request
+    app.state.api_token_bytes = settings.api_token.encode() or None
+    if not app.state.api_token_bytes:
+        # No token configured - allow all (for development)
+        logger.warning("No API_TOKEN configured - authentication disabled")
+    
     # Initialize Presidio service (downloads spaCy model if needed)
-    presidio = PresidioService()
+    start = time.perf_counter()
+    presidio = PresidioService(
+        batch_size=settings.presidio_spacy_batch_size,
+        cache_size=settings.presidio_cache_size,
+        lazy_spacy=settings.presidio_lazy_spacy
+    )
     app.state.presidio = presidio
+    logger.info(f"Presidio engines loaded in {time.perf_counter() - start:.2f}s")
+    
+    # Force the spaCy model into memory so the first request doesn't pay for it
+    start = time.perf_counter()
+    presidio.analyzer.nlp_engine.nlp[settings.default_language]("warmup")
+    logger.info(f"spaCy model warmed up in {time.perf_counter() - start:.2f}s")
+    
+    # Warm recognizers, regex compilation and NER weights through the batch
+    # path the routes use, so a broken batch path fails at startup
+    start = time.perf_counter()
+    warmup_texts = ["John Doe lives in Paris.", "Call 555-123-4567 on 01/02/2024."]
+    presidio.analyze_batch(
+        warmup_texts,
+        settings.default_language,
+        presidio.healthcare_entities
+    )
+    presidio.sanitize_batch(
+        warmup_texts,
+        settings.default_language,
+        presidio.healthcare_entities
+    )
+    presidio.cache_clear()
+    logger.info(f"Recognizers warmed up in {time.perf_counter() - start:.2f}s")
+    
+    # Bounded worker pool for blocking Presidio calls
+    executor = ThreadPoolExecutor(
+        max_workers=settings.presidio_workers,
+        thread_name_prefix="presidio"
+    )
+    
+    # Coalesce concurrent requests into batched spaCy calls
+    app.state.analyze_batcher = MicroBatcher(
+        presidio.analyze_batch,
+        max_batch_size=settings.presidio_spacy_batch_size,
+        max_wait_ms=settings.presidio_batch_window_ms,
+        executor=executor
+    )
+    app.state.sanitize_batcher = MicroBatcher(
+        presidio.sanitize_batch,
+        max_batch_size=settings.presidio_spacy_batch_size,
+        max_wait_ms=settings.presidio_batch_window_ms,
+        executor=executor
+    )
+    app.state.analyze_batcher.start()
+    app.state.sanitize_batcher.start()
     
     logger.info("Presidio Microservice started successfully")
     
@@ -37,6 +100,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Presidio Microservice...")
+    await app.state.analyze_batcher.stop()
+    await app.state.sanitize_batcher.stop()
+    executor.shutdown(wait=False, cancel_futures=True)
 
 
 # Create FastAPI app
@@ -44,60 +110,21 @@ app = FastAPI(
     title="Presidio PII Sanitization Service",
     description="Microservice for detecting and anonymizing PII using Microsoft Presidio",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# CORS middleware (for internal Render network)
+# Token auth + CORS middleware (for internal Render network)
 app.add_middleware(
-    CORSMiddleware,
+    AuthCORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-
-# Token authentication dependency
-async def verify_token(request: Request, settings: Settings = Depends(get_settings)):
-    """Verify API token from header."""
-    # Skip auth for health check
-    if request.url.path == "/health":
-        return True
-    
-    # Get token from header
-    token = request.headers.get("X-API-Token")
-    
-    if not settings.api_token:
-        # No token configured - allow all (for development)
-        logger.warning("No API_TOKEN configured - authentication disabled")
-        return True
-    
-    if not token or token != settings.api_token:
-        raise HTTPException(status_code=401, detail="Invalid or missing API token")
-    
-    return True
-
-
-# Apply token verification to all routes
-@app.middleware("http")
-async def auth_middleware(request: Request, call_next):
-    """Authentication middleware."""
-    # Skip auth for health check
-    if request.url.path == "/health":
-        return await call_next(request)
-    
-    settings = get_settings()
-    
-    if settings.api_token:
-        token = request.headers.get("X-API-Token")
-        if not token or token != settings.api_token:
-            from fastapi.responses import JSONResponse
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Invalid or missing API token"}
-            )
-    
-    return await call_next(request)
+# Compress larger responses only; small ones (e.g. /health) aren't worth it
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 
 # Include routers
@@ -114,3 +141,16 @@ async def root():
         "version": "1.0.0",
         "status": "running"
     }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    settings = get_settings()
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=settings.port,
+        # loop/http default to "auto": uvloop and httptools when installed
+        workers=settings.workers
+    )
@@ -0,0 +1,45 @@
+"""
+ASGI middleware - token authentication and CORS in a single layer.
+"""
+
+import hmac
+
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+
+# Paths served without authentication
+_HEALTH_PATH = "/health"
+_TOKEN_HEADER = b"x-api-token"
+
+
+class AuthCORSMiddleware:
+    """Check the X-API-Token header, then hand off to CORSMiddleware."""
+
+    def __init__(self, app, **cors_options):
+        self.cors = CORSMiddleware(app, **cors_options)
+
+    async def __call__(self, scope, receive, send):
+        # Skip auth for non-HTTP scopes and the health check
+        if scope["type"] != "http" or scope["path"] == _HEALTH_PATH:
+            await self.cors(scope, receive, send)
+            return
+
+        token_bytes = scope["app"].state.api_token_bytes
+
+        if token_bytes:
+            # ASGI header names are already lower-cased bytes
+            token = None
+            for name, value in scope["headers"]:
+                if name == _TOKEN_HEADER:
+                    token = value
+                    break
+
+            if not token or not hmac.compare_digest(token, token_bytes):
+                response = ORJSONResponse(
+                    status_code=401,
+                    content={"detail": "Invalid or missing API token"}
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.cors(scope, receive, send)
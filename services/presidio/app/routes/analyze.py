@@ -3,15 +3,16 @@ Analyze endpoint - detect PII without anonymizing.
 """
 
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import ORJSONResponse
 import logging
 
-from app.models.schemas import AnalyzeRequest, AnalyzeResponse, EntityResult
+from app.models.schemas import AnalyzeRequest, AnalyzeResponse
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-@router.post("/analyze", response_model=AnalyzeResponse)
+@router.post("/analyze", responses={200: {"model": AnalyzeResponse}})
 async def analyze_text(request: Request, body: AnalyzeRequest):
     """
     Analyze text for PII without anonymizing.
@@ -20,32 +21,31 @@ async def analyze_text(request: Request, body: AnalyzeRequest):
     Returns list of detected entities with positions and confidence scores.
     """
     try:
-        # Get Presidio service from app state
+        # Repeated inputs are answered from the cache without a batch round trip
         presidio = request.app.state.presidio
-        
-        # Analyze text
-        entities = presidio.analyze(
+        entities = presidio.analyze_cached(
             text=body.text,
             language=body.language,
             entities=body.entities
         )
         
-        # Convert to response model
-        entities_found = [
-            EntityResult(
-                type=e["type"],
-                text=e["text"],
-                start=e["start"],
-                end=e["end"],
-                score=e["score"]
+        if entities is None:
+            # Get batcher from app state
+            batcher = request.app.state.analyze_batcher
+            
+            # Analyze text (batched with concurrent requests)
+            entities = await batcher.submit(
+                text=body.text,
+                language=body.language,
+                entities=body.entities
             )
-            for e in entities
-        ]
         
-        return AnalyzeResponse(
-            text=body.text,
-            entities=entities_found
-        )
+        # Entities are already dicts in the response shape; returning the
+        # response directly skips FastAPI's jsonable_encoder pass
+        return ORJSONResponse({
+            "text": body.text,
+            "entities": entities
+        })
         
     except Exception as e:
         logger.error(f"Error in /analyze: {e}")
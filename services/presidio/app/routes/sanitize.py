@@ -3,15 +3,16 @@ Sanitize endpoint - anonymize PII in text.
 """
 
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import ORJSONResponse
 import logging
 
-from app.models.schemas import SanitizeRequest, SanitizeResponse, EntityResult
+from app.models.schemas import SanitizeRequest, SanitizeResponse
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-@router.post("/sanitize", response_model=SanitizeResponse)
+@router.post("/sanitize", responses={200: {"model": SanitizeResponse}})
 async def sanitize_text(request: Request, body: SanitizeRequest):
     """
     Sanitize text by replacing PII with placeholders.
@@ -28,33 +29,19 @@ async def sanitize_text(request: Request, body: SanitizeRequest):
     Returns the sanitized text and list of detected entities.
     """
     try:
-        # Get Presidio service from app state
-        presidio = request.app.state.presidio
+        # Get batcher from app state
+        batcher = request.app.state.sanitize_batcher
         
-        # Sanitize text
-        result = presidio.sanitize(
+        # Sanitize text (batched with concurrent requests)
+        result = await batcher.submit(
             text=body.text,
             language=body.language,
             entities=body.entities
         )
         
-        # Convert to response model
-        entities_found = [
-            EntityResult(
-                type=e["type"],
-                text=e["text"],
-                start=e["start"],
-                end=e["end"],
-                score=e["score"]
-            )
-            for e in result["entities_found"]
-        ]
-        
-        return SanitizeResponse(
-            original_text=result["original_text"],
-            sanitized_text=result["sanitized_text"],
-            entities_found=entities_found
-        )
+        # Result is already a dict in the response shape; returning the
+        # response directly skips FastAPI's jsonable_encoder pass
+        return ORJSONResponse(result)
         
     except Exception as e:
         logger.error(f"Error in /sanitize: {e}")
@@ -0,0 +1,153 @@
+"""
+Micro-batcher - coalesce concurrent requests into one Presidio batch call.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collects requests for a few milliseconds and dispatches them together."""
+
+    def __init__(
+        self,
+        batch_fn: Callable[..., List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None
+    ):
+        """
+        Args:
+            batch_fn: Callable taking (texts, language, entities) and returning
+                one result per text, in input order
+            max_batch_size: Maximum number of requests dispatched together
+            max_wait_ms: How long to wait for more requests after the first
+            executor: Executor running batch_fn off the event loop
+                (None uses the loop's default executor)
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self._dispatches: Set[asyncio.Task] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background dispatch loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the dispatch loop and cancel any requests still waiting."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for task in list(self._dispatches):
+            task.cancel()
+
+        while self._queue and not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def submit(
+        self,
+        text: str,
+        language: str = "en",
+        entities: Optional[List[str]] = None
+    ) -> Any:
+        """Queue a single text and wait for its slice of the batch result."""
+        future = asyncio.get_running_loop().create_future()
+        key = (language, tuple(entities) if entities else None)
+        self._queue.put_nowait((key, text, future))
+        return await future
+
+    async def _run(self):
+        """Gather pending requests until the window closes, then dispatch."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Dispatch in the background so the next batch can be gathered
+            # while this one runs on a worker thread
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, str, asyncio.Future]]):
+        """Run batch_fn once per (language, entities) group and resolve futures."""
+        groups: Dict[Any, List[Tuple[str, asyncio.Future]]] = {}
+        for key, text, future in batch:
+            groups.setdefault(key, []).append((text, future))
+
+        loop = asyncio.get_running_loop()
+        for (language, entities), items in groups.items():
+            texts = [text for text, _ in items]
+            try:
+                # spaCy and Presidio are blocking; keep them off the event loop
+                results = await loop.run_in_executor(
+                    self.executor,
+                    self.batch_fn,
+                    texts,
+                    language,
+                    list(entities) if entities else None
+                )
+            except Exception as e:
+                logger.error(f"Error in batch of {len(texts)} texts: {e}")
+                if len(items) > 1:
+                    # Retry one by one so a bad input only fails its own request
+                    await self._dispatch_each(loop, items, language, entities)
+                elif not items[0][1].done():
+                    items[0][1].set_exception(e)
+                continue
+
+            for (_, future), result in zip(items, results):
+                # Callers may have gone away (e.g. client disconnect)
+                if not future.done():
+                    future.set_result(result)
+
+    async def _dispatch_each(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        items: List[Tuple[str, asyncio.Future]],
+        language: str,
+        entities: Optional[Tuple[str, ...]]
+    ):
+        """Run batch_fn on each text alone, resolving only that text's future."""
+        for text, future in items:
+            if future.done():
+                continue
+            try:
+                results = await loop.run_in_executor(
+                    self.executor,
+                    self.batch_fn,
+                    [text],
+                    language,
+                    list(entities) if entities else None
+                )
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+
+            if not future.done():
+                future.set_result(results[0])
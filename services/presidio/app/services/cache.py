@@ -0,0 +1,56 @@
+"""
+Result cache - bounded LRU for analyzer results keyed by a text digest.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+import xxhash
+
+
+def make_key(
+    text: str,
+    language: str,
+    entities: Optional[List[str]] = None
+) -> Tuple[int, str, Optional[Tuple[str, ...]]]:
+    """Build a cache key without keeping the (possibly large) text alive."""
+    entities_key = tuple(sorted(entities)) if entities else None
+    return (
+        # 128-bit so a collision can't realistically return another text's PII
+        xxhash.xxh3_128_intdigest(text.encode()),
+        language,
+        entities_key
+    )
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a fixed maximum size (0 disables it)."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Store value, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached entries."""
+        with self._lock:
+            self._data.clear()
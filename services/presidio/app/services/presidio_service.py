@@ -3,23 +3,113 @@ Presidio Service - Wrapper for Microsoft Presidio analyzer and anonymizer.
 """
 
 import logging
-from typing import List, Optional
+import threading
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
 from presidio_analyzer import AnalyzerEngine, RecognizerResult
+from presidio_analyzer.nlp_engine import NlpArtifacts, NlpEngineProvider
 from presidio_anonymizer import AnonymizerEngine
 from presidio_anonymizer.entities import OperatorConfig
 
+from app.services.cache import ResultCache, make_key
+
 logger = logging.getLogger(__name__)
 
+# spaCy NLP engine configuration. The entity mapping is spelled out because
+# NER_ENTITIES is derived from it; everything else is left to Presidio's
+# NerModelConfiguration defaults so detection matches the stock analyzer.
+NLP_CONFIGURATION = {
+    "nlp_engine_name": "spacy",
+    "models": [{"lang_code": "en", "model_name": "en_core_web_sm"}],
+    "ner_model_configuration": {
+        "model_to_presidio_entity_mapping": {
+            "PER": "PERSON",
+            "PERSON": "PERSON",
+            "NORP": "NRP",
+            "LOC": "LOCATION",
+            "GPE": "LOCATION",
+            "LOCATION": "LOCATION",
+            "ORG": "ORGANIZATION",
+            "ORGANIZATION": "ORGANIZATION",
+            "DATE": "DATE_TIME",
+            "TIME": "DATE_TIME"
+        }
+    }
+}
+
+# spaCy components PII detection doesn't need. NER has its own internal
+# tok2vec; the shared one only feeds the tagger and parser. The lemmatizer is
+# kept only so lemma_ isn't empty: without POS tags it just lower-cases tokens
+# (warning W108), which is what Presidio's context enhancer matches against.
+UNUSED_SPACY_PIPES = ("tok2vec", "tagger", "parser")
+
+# Placeholder substituted for each entity type when sanitizing
+PLACEHOLDERS = MappingProxyType({
+    "DEFAULT": "<REDACTED>",
+    "PERSON": "<PERSON>",
+    "EMAIL_ADDRESS": "<EMAIL>",
+    "PHONE_NUMBER": "<PHONE>",
+    "DATE_TIME": "<DATE>",
+    "LOCATION": "<LOCATION>",
+    "US_SSN": "<SSN>",
+    "CREDIT_CARD": "<CREDIT_CARD>",
+    "IP_ADDRESS": "<IP_ADDRESS>",
+    "URL": "<URL>",
+    "US_DRIVER_LICENSE": "<DRIVER_LICENSE>",
+    "MEDICAL_LICENSE": "<MEDICAL_LICENSE>"
+})
+
+# Entity types that come from spaCy NER rather than pattern recognizers
+NER_ENTITIES = frozenset(
+    NLP_CONFIGURATION["ner_model_configuration"]["model_to_presidio_entity_mapping"].values()
+)
+
+
+def build_operators() -> Dict[str, OperatorConfig]:
+    """
+    Build anonymizer operators from PLACEHOLDERS.
+    
+    Only used when results overlap and need the anonymizer's conflict
+    resolution; see PresidioService._replace_entities for the common case.
+    The anonymizer writes into each OperatorConfig's params on every call,
+    so the result must not be shared across threads.
+    """
+    return {
+        entity_type: OperatorConfig("replace", {"new_value": placeholder})
+        for entity_type, placeholder in PLACEHOLDERS.items()
+    }
+
 
 class PresidioService:
     """Service for PII detection and anonymization using Microsoft Presidio."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        batch_size: int = 32,
+        cache_size: int = 1024,
+        lazy_spacy: bool = True
+    ):
         """Initialize Presidio analyzer and anonymizer engines."""
         logger.info("Initializing Presidio engines...")
         
+        # Skip spaCy NER when no NER-backed entity type is requested
+        self.lazy_spacy = lazy_spacy
+        
+        # Number of documents spaCy processes per nlp.pipe() call
+        self.batch_size = batch_size
+        
+        # Bounded LRU of analyze results for repeated inputs
+        self._cache = ResultCache(maxsize=cache_size)
+        
+        # Load spaCy with only the components needed for NER
+        nlp_engine = NlpEngineProvider(nlp_configuration=NLP_CONFIGURATION).create_engine()
+        for nlp in nlp_engine.nlp.values():
+            for pipe in UNUSED_SPACY_PIPES:
+                if pipe in nlp.pipe_names:
+                    nlp.disable_pipe(pipe)
+        
         # Initialize analyzer with default recognizers
-        self.analyzer = AnalyzerEngine()
+        self.analyzer = AnalyzerEngine(nlp_engine=nlp_engine)
         
         # Initialize anonymizer
         self.anonymizer = AnonymizerEngine()
@@ -39,6 +129,12 @@ class PresidioService:
             "MEDICAL_LICENSE"
         ]
         
+        # Registry is fixed after startup, so resolve supported entities once
+        self._supported_entities = tuple(self.analyzer.get_supported_entities())
+        
+        # Anonymizer operators, built once per worker thread (see _operators)
+        self._local = threading.local()
+        
         logger.info("Presidio engines initialized successfully")
     
     def analyze(
@@ -59,34 +155,42 @@ class PresidioService:
             List of detected entities with type, text, position, and score
         """
         try:
-            # Use specified entities or healthcare defaults
-            target_entities = entities if entities else self.healthcare_entities
-            
-            # Analyze text
-            results: List[RecognizerResult] = self.analyzer.analyze(
-                text=text,
-                language=language,
-                entities=target_entities
-            )
+            key = make_key(text, language, entities)
+            entities_found = self._cache.get(key)
             
-            # Convert to dict format
-            entities_found = []
-            for result in results:
-                entities_found.append({
-                    "type": result.entity_type,
-                    "text": text[result.start:result.end],
-                    "start": result.start,
-                    "end": result.end,
-                    "score": round(result.score, 2)
-                })
+            if entities_found is None:
+                _, entities_found = self._run_analyze(text, language, entities)
+                self._cache.put(key, entities_found)
             
             logger.info(f"Analyzed text: found {len(entities_found)} entities")
-            return entities_found
+            return self._copy_entities(entities_found)
             
         except Exception as e:
             logger.error(f"Error analyzing text: {e}")
             raise
     
+    def analyze_cached(
+        self,
+        text: str,
+        language: str = "en",
+        entities: Optional[List[str]] = None
+    ) -> Optional[List[dict]]:
+        """
+        Return cached analyze results without running the pipeline.
+        
+        Args:
+            text: Text to analyze
+            language: Language code (default: en)
+            entities: Specific entity types to detect, or None for all
+            
+        Returns:
+            A copy of the cached entities, or None on a cache miss
+        """
+        entities_found = self._cache.get(make_key(text, language, entities))
+        if entities_found is None:
+            return None
+        return self._copy_entities(entities_found)
+    
     def sanitize(
         self,
         text: str,
@@ -105,68 +209,281 @@ class PresidioService:
             Dict with original_text, sanitized_text, and entities_found
         """
         try:
-            # Use specified entities or healthcare defaults
-            target_entities = entities if entities else self.healthcare_entities
-            
             # Analyze text first
-            analyzer_results = self.analyzer.analyze(
-                text=text,
-                language=language,
-                entities=target_entities
-            )
+            analyzer_results, entities_found = self._run_analyze(text, language, entities)
             
-            if not analyzer_results:
-                # No PII found
-                logger.info("No PII found in text")
-                return {
-                    "original_text": text,
-                    "sanitized_text": text,
-                    "entities_found": []
-                }
-            
-            # Anonymize - replace with entity type placeholders
-            anonymized = self.anonymizer.anonymize(
-                text=text,
-                analyzer_results=analyzer_results,
-                operators={
-                    "DEFAULT": OperatorConfig("replace", {"new_value": "<REDACTED>"}),
-                    "PERSON": OperatorConfig("replace", {"new_value": "<PERSON>"}),
-                    "EMAIL_ADDRESS": OperatorConfig("replace", {"new_value": "<EMAIL>"}),
-                    "PHONE_NUMBER": OperatorConfig("replace", {"new_value": "<PHONE>"}),
-                    "DATE_TIME": OperatorConfig("replace", {"new_value": "<DATE>"}),
-                    "LOCATION": OperatorConfig("replace", {"new_value": "<LOCATION>"}),
-                    "US_SSN": OperatorConfig("replace", {"new_value": "<SSN>"}),
-                    "CREDIT_CARD": OperatorConfig("replace", {"new_value": "<CREDIT_CARD>"}),
-                    "IP_ADDRESS": OperatorConfig("replace", {"new_value": "<IP_ADDRESS>"}),
-                    "URL": OperatorConfig("replace", {"new_value": "<URL>"}),
-                    "US_DRIVER_LICENSE": OperatorConfig("replace", {"new_value": "<DRIVER_LICENSE>"}),
-                    "MEDICAL_LICENSE": OperatorConfig("replace", {"new_value": "<MEDICAL_LICENSE>"})
-                }
+            return self._anonymize(text, analyzer_results, entities_found)
+            
+        except Exception as e:
+            logger.error(f"Error sanitizing text: {e}")
+            raise
+    
+    def analyze_batch(
+        self,
+        texts: List[str],
+        language: str = "en",
+        entities: Optional[List[str]] = None
+    ) -> List[List[dict]]:
+        """
+        Analyze several texts in one pass through the spaCy pipeline.
+        
+        Args:
+            texts: Texts to analyze
+            language: Language code shared by all texts (default: en)
+            entities: Specific entity types to detect, or None for all
+            
+        Returns:
+            One list of detected entities per input text, in input order
+        """
+        try:
+            keys = [make_key(text, language, entities) for text in texts]
+            entities_found = [self._cache.get(key) for key in keys]
+            
+            # Only run the pipeline on texts that aren't cached
+            misses = [i for i, found in enumerate(entities_found) if found is None]
+            if misses:
+                batch_results = self._run_analyze_batch(
+                    [texts[i] for i in misses], language, entities
+                )
+                for i, (_, found) in zip(misses, batch_results):
+                    entities_found[i] = found
+                    self._cache.put(keys[i], found)
+            
+            logger.info(
+                f"Analyzed batch of {len(texts)} texts ({len(texts) - len(misses)} cached)"
             )
+            return [self._copy_entities(found) for found in entities_found]
             
-            # Build entities list
-            entities_found = []
-            for result in analyzer_results:
-                entities_found.append({
-                    "type": result.entity_type,
-                    "text": text[result.start:result.end],
-                    "start": result.start,
-                    "end": result.end,
-                    "score": round(result.score, 2)
-                })
+        except Exception as e:
+            logger.error(f"Error analyzing batch: {e}")
+            raise
+    
+    def sanitize_batch(
+        self,
+        texts: List[str],
+        language: str = "en",
+        entities: Optional[List[str]] = None
+    ) -> List[dict]:
+        """
+        Sanitize several texts in one pass through the spaCy pipeline.
+        
+        Args:
+            texts: Texts to sanitize
+            language: Language code shared by all texts (default: en)
+            entities: Specific entity types to detect, or None for all
+            
+        Returns:
+            One sanitize result dict per input text, in input order
+        """
+        try:
+            batch_results = self._run_analyze_batch(texts, language, entities)
+            
+            sanitized = [
+                self._anonymize(text, results, entities_found)
+                for text, (results, entities_found) in zip(texts, batch_results)
+            ]
             
-            logger.info(f"Sanitized text: replaced {len(entities_found)} entities")
+            logger.info(f"Sanitized batch of {len(texts)} texts")
+            return sanitized
             
+        except Exception as e:
+            logger.error(f"Error sanitizing batch: {e}")
+            raise
+    
+    def get_supported_entities(self) -> Tuple[str, ...]:
+        """Get supported entity types."""
+        return self._supported_entities
+    
+    def cache_clear(self):
+        """Drop all cached analyze results."""
+        self._cache.clear()
+    
+    def _run_analyze(
+        self,
+        text: str,
+        language: str,
+        entities: Optional[List[str]]
+    ) -> Tuple[List[RecognizerResult], List[dict]]:
+        """Analyze text, returning the raw results and their dict view."""
+        self._check_language(language)
+        
+        # Use specified entities or healthcare defaults
+        target_entities = entities if entities else self.healthcare_entities
+        
+        results = self.analyzer.analyze(
+            text=text,
+            language=language,
+            entities=target_entities,
+            nlp_artifacts=self._nlp_artifacts(text, language, target_entities)
+        )
+        
+        return results, self._to_entity_dicts(text, results)
+    
+    def _run_analyze_batch(
+        self,
+        texts: List[str],
+        language: str,
+        entities: Optional[List[str]]
+    ) -> List[Tuple[List[RecognizerResult], List[dict]]]:
+        """Run texts through nlp.pipe() once, then the recognizers per text."""
+        self._check_language(language)
+        
+        target_entities = entities if entities else self.healthcare_entities
+        
+        if self._needs_ner(target_entities):
+            # nlp.pipe() amortizes model dispatch and NER inference across the
+            # batch. Presidio's own process_batch() can't set batch_size in the
+            # pinned release, so convert each Doc the same way it does.
+            nlp_engine = self.analyzer.nlp_engine
+            docs = nlp_engine.nlp[language].pipe(texts, batch_size=self.batch_size)
+            nlp_results = [
+                (text, nlp_engine._doc_to_nlp_artifact(doc, language))
+                for text, doc in zip(texts, docs)
+            ]
+        else:
+            nlp_results = [(text, self._tokenize(text, language)) for text in texts]
+        
+        batch_results = []
+        for text, nlp_artifacts in nlp_results:
+            results = self.analyzer.analyze(
+                text=text,
+                language=language,
+                entities=target_entities,
+                nlp_artifacts=nlp_artifacts
+            )
+            batch_results.append((results, self._to_entity_dicts(text, results)))
+        
+        return batch_results
+    
+    def _check_language(self, language: str):
+        """Raise ValueError if no spaCy model is loaded for language."""
+        if language not in self.analyzer.nlp_engine.nlp:
+            raise ValueError(
+                f"No spaCy model loaded for language '{language}'. "
+                f"Supported languages: {', '.join(self.analyzer.nlp_engine.nlp)}"
+            )
+    
+    def _needs_ner(self, target_entities: List[str]) -> bool:
+        """Whether any requested entity type depends on spaCy NER."""
+        return not self.lazy_spacy or not NER_ENTITIES.isdisjoint(target_entities)
+    
+    def _nlp_artifacts(
+        self,
+        text: str,
+        language: str,
+        target_entities: List[str]
+    ) -> Optional[NlpArtifacts]:
+        """Tokenizer-only artifacts when NER isn't needed, else None (full pipeline)."""
+        if self._needs_ner(target_entities):
+            return None
+        return self._tokenize(text, language)
+    
+    def _tokenize(self, text: str, language: str) -> NlpArtifacts:
+        """Build NlpArtifacts from the spaCy tokenizer alone, skipping NER."""
+        doc = self.analyzer.nlp_engine.nlp[language].make_doc(text)
+        return NlpArtifacts(
+            entities=[],
+            tokens=doc,
+            tokens_indices=[token.idx for token in doc],
+            # Matches the lemmatizer's output when the tagger is disabled
+            lemmas=[token.lower_ for token in doc],
+            nlp_engine=self.analyzer.nlp_engine,
+            language=language
+        )
+    
+    def _operators(self) -> Dict[str, OperatorConfig]:
+        """
+        Anonymization operators for the current thread, built on first use.
+        
+        The anonymizer writes into each OperatorConfig's params on every
+        call, so configs are reused per worker thread rather than shared.
+        """
+        operators = getattr(self._local, "operators", None)
+        if operators is None:
+            operators = self._local.operators = build_operators()
+        return operators
+    
+    def _anonymize(
+        self,
+        text: str,
+        analyzer_results: List[RecognizerResult],
+        entities_found: List[dict]
+    ) -> dict:
+        """Replace detected entities with placeholders and build the result dict."""
+        if not analyzer_results:
+            # No PII found
+            logger.info("No PII found in text")
             return {
                 "original_text": text,
-                "sanitized_text": anonymized.text,
-                "entities_found": entities_found
+                "sanitized_text": text,
+                "entities_found": []
             }
+        
+        # Replace with entity type placeholders
+        sanitized_text = self._replace_entities(text, analyzer_results)
+        
+        if sanitized_text is None:
+            # Overlapping results - let the anonymizer resolve conflicts
+            sanitized_text = self.anonymizer.anonymize(
+                text=text,
+                analyzer_results=analyzer_results,
+                operators=self._operators()
+            ).text
+        
+        logger.info(f"Sanitized text: replaced {len(entities_found)} entities")
+        
+        return {
+            "original_text": text,
+            "sanitized_text": sanitized_text,
+            "entities_found": entities_found
+        }
+    
+    @staticmethod
+    def _replace_entities(text: str, results: List[RecognizerResult]) -> Optional[str]:
+        """
+        Splice placeholders into text in a single pass.
+        
+        Returns None when results overlap, or when same-type results are
+        separated only by whitespace (the anonymizer merges those), so the
+        caller can fall back to AnonymizerEngine and keep its output.
+        """
+        parts = []
+        position = 0
+        previous = None
+        
+        for result in sorted(results, key=lambda r: (r.start, r.end)):
+            if previous is not None:
+                if result.start < previous.end:
+                    return None
+                if (
+                    result.entity_type == previous.entity_type
+                    and not text[previous.end:result.start].strip()
+                ):
+                    return None
             
-        except Exception as e:
-            logger.error(f"Error sanitizing text: {e}")
-            raise
+            parts.append(text[position:result.start])
+            parts.append(PLACEHOLDERS.get(result.entity_type, PLACEHOLDERS["DEFAULT"]))
+            position = result.end
+            previous = result
+        
+        parts.append(text[position:])
+        return "".join(parts)
+    
+    @staticmethod
+    def _to_entity_dicts(text: str, results: List[RecognizerResult]) -> List[dict]:
+        """Convert analyzer results to the dict format returned by the API."""
+        return [
+            {
+                "type": result.entity_type,
+                "text": text[result.start:result.end],
+                "start": result.start,
+                "end": result.end,
+                "score": round(result.score, 2)
+            }
+            for result in results
+        ]
     
-    def get_supported_entities(self) -> List[str]:
-        """Get list of supported entity types."""
-        return self.analyzer.get_supported_entities()
+    @staticmethod
+    def _copy_entities(entities_found: List[dict]) -> List[dict]:
+        """Copy cached entities so callers can't mutate cached state."""
+        return [dict(entity) for entity in entities_found]
@@ -4,6 +4,7 @@ Shared authentication utilities for Python microservices.
 
 from functools import wraps
 from fastapi import Request, HTTPException
+import hmac
 import os
 
 
@@ -17,7 +18,8 @@ def verify_token(token: str) -> bool:
     expected = get_api_token()
     if not expected:
         return True  # No token configured, allow all
-    return token == expected
+    # Constant-time comparison; bytes so non-ASCII tokens don't raise
+    return hmac.compare_digest((token or "").encode(), expected.encode())
 
 
 def require_auth(func):